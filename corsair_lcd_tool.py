@@ -1,13 +1,20 @@
 import logging
 import os
 import platform
+import queue
+import struct
 import sys
+import time
 from dataclasses import dataclass
 import cv2
 import hid
 import numpy as np
 import yaml
-from PyQt6.QtCore import Qt, QTimer, QPointF, pyqtSignal, QThread, pyqtSlot, QRectF
+try:
+    from yaml import CSafeLoader as YamlLoader, CSafeDumper as YamlDumper
+except ImportError:
+    from yaml import SafeLoader as YamlLoader, SafeDumper as YamlDumper
+from PyQt6.QtCore import Qt, QTimer, QPointF, QThread, QRectF, QMutex, QMutexLocker
 from PyQt6.QtGui import QPixmap, QPainter, QMovie, QIcon, QTransform, QImage, QAction, QPalette, QColor
 from PyQt6.QtWidgets import QApplication, QMainWindow, QPushButton, QFileDialog, QSlider, QWidget, QGraphicsScene, \
     QGraphicsView, QGraphicsPixmapItem, QSystemTrayIcon, QMenu, QStyleFactory, QGraphicsItem, QCheckBox
@@ -18,6 +25,12 @@ try:
 except ImportError:
     led_controller_enabled = False
 
+try:
+    from turbojpeg import TurboJPEG, TJPF_RGBA
+    turbojpeg_enabled = True
+except ImportError:
+    turbojpeg_enabled = False
+
 if platform.system() == 'Windows':
     import winshell
 elif platform.system() == 'Linux':
@@ -29,9 +42,17 @@ logging.basicConfig(level=logging.DEBUG)
 VID = 0x1b1c  # Corsair
 PID = 0x0c39  # Corsair LCD Cap for Elite Capellix coolers
 
+JPEG_OPCODE = 0x02
+# Speculative raw framebuffer opcode; not confirmed on hardware, so raw mode
+# stays off by default and reverts to JPEG as soon as a transfer fails.
+RAW_RGB565_OPCODE = 0x03
+
 
 @dataclass
 class CorsairCommand:
+    """Protocol spec for one HID report. The hot path packs reports directly
+    with UpdateDeviceThread.pack_commands; this class documents the layout."""
+
     opcode: int  # 0x02
     unknown1: int  # 0x05
     unknown2: int  # 0x40
@@ -67,79 +88,149 @@ class CorsairCommand:
 
 
 class UpdateDeviceThread(QThread):
-    captureSignal: pyqtSignal = pyqtSignal()
-
     def __init__(self, container, main_window):
         super().__init__()
         self.container = container
         self.main = main_window
+        # The GUI thread captures and submits frames; this thread only
+        # encodes and writes, so a slow device can never stall rendering.
+        # maxsize=1 means a frame the device can't keep up with is dropped.
+        # Buffers cycle through free_queue -> frame_queue -> free_queue so the
+        # one being encoded is never the next capture target.
+        self.frame_queue = queue.Queue(maxsize=1)
+        self.free_queue = queue.Queue()
+        self.running = True
         self.device = hid.device()
         try:
             self.device.open(VID, PID)
         except Exception as e:
             logging.error(f"Error opening device: {e}")
             raise
-        QTimer.singleShot(0, self.start_timer)
-
-    def start_timer(self):
-        self.update_lcd_timer = QTimer()
-        self.update_lcd_timer.timeout.connect(self.update_lcd)
-        self.update_lcd_timer.start(int(1000 / 30))
+        self.use_raw_rgb565 = False
+        self.resize_dst = np.empty((480, 480, 4), np.uint8)
+        self.hdr_struct = struct.Struct('<BBBBHH')
+        self.packet_buf = bytearray()
+        # End of the highest byte ever written into packet_buf; bytes past it
+        # are still zero from allocation, so padding only needs clearing up to
+        # this mark.
+        self.packet_high_water = 0
+        self.zero_pad = bytes(1024)
+        # Try to hand hidapi all reports of a frame in one call; amortizes the
+        # per-write syscall overhead. Disabled at runtime if the backend only
+        # accepts single reports.
+        self.batch_writes = True
+        self.turbojpeg = None
+        if turbojpeg_enabled:
+            try:
+                self.turbojpeg = TurboJPEG()
+            except Exception as e:
+                logging.warning(f"TurboJPEG unavailable, falling back to OpenCV encoder: {e}")
+        if self.turbojpeg is not None:
+            self.encode = self.encode_turbojpeg
+        else:
+            self.encode = self.encode_opencv
+            if 'libjpeg-turbo' not in cv2.getBuildInformation():
+                logging.warning("OpenCV was built without libjpeg-turbo; JPEG encoding will be "
+                                "slow. Install PyTurboJPEG and the libjpeg-turbo library for a "
+                                "faster encode path.")
 
     def run(self):
-        self.exec()
+        while self.running:
+            try:
+                frame = self.frame_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            self.update_lcd(frame)
+            self.free_queue.put(frame)
+
+    def stop(self):
+        self.running = False
 
-    @pyqtSlot()
-    def update_lcd(self):
+    def submit_frame(self, frame):
         try:
-            image = self.main.capture_container()
+            self.frame_queue.put_nowait(frame)
+            return True
+        except queue.Full:
+            return False
 
-            width = image.width()
-            height = image.height()
-            ptr = image.bits()
-            ptr.setsize(height * width * 4)
-            arr = np.frombuffer(ptr, np.uint8).reshape((height, width, 4))
+    def update_lcd(self, arr):
+        try:
+            # The container is fixed at 480x480, so the resize is usually an
+            # identity copy that can be skipped outright.
+            if arr.shape[:2] != (480, 480):
+                arr = cv2.resize(arr, (480, 480), dst=self.resize_dst, interpolation=cv2.INTER_AREA)
+
+            if self.use_raw_rgb565:
+                if self.write_command(self.to_rgb565(arr), opcode=RAW_RGB565_OPCODE):
+                    return
+                logging.warning("Device rejected raw RGB565 frame, falling back to JPEG")
+                self.use_raw_rgb565 = False
+
+            self.write_command(self.encode(arr))
+        except Exception as e:
+            logging.error(f"Error updating LCD: {e}")
 
-            arr = cv2.resize(arr, (480, 480))
+    def encode_turbojpeg(self, arr):
+        return self.turbojpeg.encode(arr, quality=85, pixel_format=TJPF_RGBA)
 
-            image_data = cv2.imencode('.jpg', arr)[1].tobytes()
+    def encode_opencv(self, arr):
+        return cv2.imencode('.jpg', cv2.cvtColor(arr, cv2.COLOR_RGBA2BGR))[1].tobytes()
 
-            self.write_command(image_data)
-        except Exception as e:
-            logging.error(f"Error updating LCD: {e}")
+    @staticmethod
+    def to_rgb565(arr):
+        """Pack an RGBA frame into raw little-endian RGB565 bytes."""
+        r = arr[..., 0].astype(np.uint16)
+        g = arr[..., 1].astype(np.uint16)
+        b = arr[..., 2].astype(np.uint16)
+        return (((r & 0xF8) << 8) | ((g & 0xFC) << 3) | (b >> 3)).tobytes()
 
-    def make_commands(self, data, opcode=0x02, max_len=1024):
+    def pack_commands(self, data, opcode=JPEG_OPCODE, max_len=1024):
+        """Pack data into the reusable packet buffer, one report per max_len
+        slice, without allocating a CorsairCommand or bytes per chunk."""
         real_max_len = max_len - CorsairCommand.HEADER_SIZE
-        part_num = 0
-        while data:
-            if len(data) < real_max_len:
-                padded_data = data + b'\x00' * (real_max_len - len(data))
-            else:
-                padded_data = data[:real_max_len]
-            datalen = min(real_max_len, len(data))
-            data = data[real_max_len:]
-            try:
-                yield CorsairCommand(
-                    opcode=opcode,
-                    unknown1=0x05,
-                    unknown2=0x40,
-                    is_end=not bool(data),
-                    part_num=part_num,
-                    datalen=datalen,
-                    data=padded_data,
-                )
-            except Exception as e:
-                logging.error(f"Error creating CorsairCommand: {e}")
-                raise
-            part_num += 1
-
-    def write_command(self, data):
+        num_chunks = max(1, -(-len(data) // real_max_len))
+        total_len = num_chunks * max_len
+        if len(self.packet_buf) < total_len:
+            self.packet_buf = bytearray(total_len)
+            self.packet_high_water = 0
+        buf = self.packet_buf
+        zero_pad = memoryview(self.zero_pad)
+        data_mv = memoryview(data)
+        offset = 0
+        for part_num in range(num_chunks):
+            base = part_num * max_len
+            datalen = min(real_max_len, len(data) - offset)
+            is_end = 0x01 if part_num == num_chunks - 1 else 0x00
+            self.hdr_struct.pack_into(buf, base, opcode, 0x05, 0x40, is_end, part_num, datalen)
+            payload_end = base + CorsairCommand.HEADER_SIZE + datalen
+            buf[base + CorsairCommand.HEADER_SIZE:payload_end] = data_mv[offset:offset + datalen]
+            if payload_end < self.packet_high_water:
+                # Only the stale bytes a previous, larger frame left behind
+                # need re-zeroing; the rest of the padding is untouched.
+                stale_end = min(base + max_len, self.packet_high_water)
+                buf[payload_end:stale_end] = zero_pad[:stale_end - payload_end]
+            offset += datalen
+        self.packet_high_water = max(self.packet_high_water, total_len - max_len
+                                     + CorsairCommand.HEADER_SIZE + datalen)
+        return memoryview(buf)[:total_len]
+
+    def write_command(self, data, opcode=JPEG_OPCODE, max_len=1024):
         try:
-            commands = self.make_commands(data)
-            for command in commands:
-                self.device.write(command.to_bytes())
+            packet = self.pack_commands(data, opcode=opcode, max_len=max_len)
+            if self.batch_writes:
+                # A short write would silently truncate the frame, so anything
+                # other than the full packet counts as a rejection.
+                if self.device.write(packet) == len(packet):
+                    return True
+                logging.warning("Batched HID write rejected, falling back to per-packet writes")
+                self.batch_writes = False
+            for base in range(0, len(packet), max_len):
+                if self.device.write(packet[base:base + max_len]) != max_len:
+                    return False
+            return True
         except Exception as e:
             logging.error(f"Error writing command to device: {e}")
+            return False
 
 
 class MainWindow(QMainWindow):
@@ -172,6 +263,26 @@ class MainWindow(QMainWindow):
         self.container.setGeometry(60, 20, 480, 480)
         self.container.setStyleSheet("background-color: #282c34; border: 0px")
 
+        # Reused CPU-side capture target; rendering into a QPixmap first would
+        # bounce every frame through a GPU surface just to download it again.
+        self.capture_img = QImage(self.container.size(), QImage.Format.Format_RGBA8888)
+        # One numpy view over the capture pixels for the lifetime of the
+        # image; rebuilding it per frame costs an ndarray allocation and a sip
+        # buffer lookup for nothing.
+        capture_bits = self.capture_img.bits()
+        capture_bits.setsize(self.capture_img.height() * self.capture_img.width() * 4)
+        self.capture_view = np.frombuffer(capture_bits, np.uint8).reshape(
+            (self.capture_img.height(), self.capture_img.width(), 4))
+        # Guards capture_img between the LCD thread (which renders it) and the
+        # LED controller (which only samples the latest render).
+        self.capture_mutex = QMutex()
+        self.capture_seq = 0
+
+        # Set whenever the scene content may have changed; while clean, the
+        # capture loop only sends an occasional keepalive frame.
+        self.dirty = True
+        self.last_push = 0.0
+
         self.scene = QGraphicsScene(self.container)
         self.view = NoScrollGraphicsView(self.scene, self.container)
         self.view.setGeometry(0, 0, 480, 480)
@@ -179,6 +290,7 @@ class MainWindow(QMainWindow):
         self.view.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
         self.view.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
         self.view.setTransformationAnchor(QGraphicsView.ViewportAnchor.AnchorUnderMouse)
+        self.scene.changed.connect(self.mark_dirty)
 
         self.open_button = QPushButton("Open Image", self)
         self.open_button.setGeometry(60, 540, 120, 30)
@@ -214,6 +326,7 @@ class MainWindow(QMainWindow):
         self.slider.setValue(100)
         self.slider.setDisabled(True)
         self.slider.valueChanged.connect(self.scale_image)
+        self.slider.valueChanged.connect(self.mark_dirty)
 
         restore_action = QAction("Restore", self)
         restore_action.triggered.connect(self.showNormal)
@@ -235,7 +348,22 @@ class MainWindow(QMainWindow):
         try:
             self.updateDeviceThread = UpdateDeviceThread(self.container, self)
             self.updateDeviceThread.start()
+            QApplication.instance().aboutToQuit.connect(self.updateDeviceThread.stop)
             self.frames = []
+
+            # Three frame buffers: one being captured into, one waiting in the
+            # queue, one at the worker being encoded. With only two, the GUI
+            # could reclaim a buffer the worker was still encoding whenever
+            # encode+write ran longer than a capture tick.
+            size = self.container.size()
+            for _ in range(3):
+                self.updateDeviceThread.free_queue.put(
+                    np.empty((size.height(), size.width(), 4), np.uint8))
+            self.capture_overruns = 0
+            self.capture_recovered = 0
+            self.capture_timer = QTimer(self)
+            self.capture_timer.timeout.connect(self.push_frame)
+            self.capture_timer.start(int(1000 / 30))
         except Exception as e:
             logging.error(f"Error initializing MainWindow: {e}")
             raise
@@ -349,18 +477,38 @@ class MainWindow(QMainWindow):
 
         self.movie = QMovie(file_name)
 
+        # Decode and upload every frame once at load time so playback is just
+        # an index into already-built pixmaps instead of a QImage->QPixmap
+        # conversion per tick.
+        self.gif_pixmaps = []
+        for i in range(self.movie.frameCount()):
+            if not self.movie.jumpToFrame(i):
+                self.gif_pixmaps = []
+                break
+            image = self.movie.currentImage().convertToFormat(QImage.Format.Format_RGBA8888)
+            self.gif_pixmaps.append(QPixmap.fromImage(image))
+
         self.pixmap_item = QGraphicsPixmapItem()
 
         self.pixmap_item.setFlag(QGraphicsItem.GraphicsItemFlag.ItemIsMovable)
 
         self.scene.addItem(self.pixmap_item)
 
-        self.movie.frameChanged.connect(lambda: self.pixmap_item.setPixmap(QPixmap.fromImage(self.movie.currentImage())))
+        if self.gif_pixmaps:
+            self.movie.frameChanged.connect(self.show_gif_frame)
+        else:
+            # Some formats can't report frameCount up front; decode per frame
+            # as before.
+            self.movie.frameChanged.connect(
+                lambda: self.pixmap_item.setPixmap(QPixmap.fromImage(self.movie.currentImage())))
 
         self.movie.start()
 
         self.slider.setEnabled(True)
 
+    def show_gif_frame(self, frame_number):
+        self.pixmap_item.setPixmap(self.gif_pixmaps[frame_number % len(self.gif_pixmaps)])
+
     def reset_image(self):
         if self.current_image_path is not None:
             self.load_new_image(self.current_image_path)
@@ -377,30 +525,82 @@ class MainWindow(QMainWindow):
 
     def capture_container(self):
         try:
-            pixmap = QPixmap(self.container.size())
-            self.container.render(pixmap)
-            return pixmap.toImage()
+            with QMutexLocker(self.capture_mutex):
+                self.capture_img.fill(0)
+                painter = QPainter(self.capture_img)
+                self.container.render(painter)
+                painter.end()
+                self.capture_seq += 1
+            return self.capture_img
         except Exception as e:
             logging.error(f"Error in capture_container: {e}")
             return QImage()
 
+    def mark_dirty(self, *args):
+        self.dirty = True
+
+    def push_frame(self):
+        try:
+            # Nothing changed: keep the device alive with a frame every few
+            # seconds instead of re-encoding 30 identical frames per second.
+            if not self.dirty and time.monotonic() - self.last_push < 5.0:
+                return
+            try:
+                buf = self.updateDeviceThread.free_queue.get_nowait()
+            except queue.Empty:
+                buf = None
+            submitted = False
+            if buf is not None:
+                self.capture_container()
+                np.copyto(buf, self.capture_view)
+                submitted = self.updateDeviceThread.submit_frame(buf)
+                if not submitted:
+                    self.updateDeviceThread.free_queue.put(buf)
+            if submitted:
+                self.dirty = False
+                self.last_push = time.monotonic()
+                self.capture_overruns = 0
+                # Ease back up to 30 FPS once the device has kept up for a
+                # second of throttled frames.
+                if self.capture_timer.interval() != int(1000 / 30):
+                    self.capture_recovered += 1
+                    if self.capture_recovered >= 15:
+                        self.capture_timer.setInterval(int(1000 / 30))
+                        logging.debug("HID pipe caught up, restoring 30 FPS capture")
+            else:
+                # Device still busy with the previous frame: drop this one and
+                # back off to 15 FPS after a run of consecutive overruns.
+                self.capture_overruns += 1
+                self.capture_recovered = 0
+                if self.capture_overruns >= 5 and self.capture_timer.interval() != int(1000 / 15):
+                    self.capture_timer.setInterval(int(1000 / 15))
+                    logging.debug("HID pipe falling behind, throttling capture to 15 FPS")
+        except Exception as e:
+            logging.error(f"Error capturing frame: {e}")
+
 
 class SaveStateHandler:
     def __init__(self, main_window):
-        self.old_pos = None
+        self.old_state = None
         self.main = main_window
         self.is_first_load = True
         self.check_state_timer = QTimer()
-        self.check_state_timer.setInterval(1000)
+        self.check_state_timer.setInterval(2000)
         self.check_state_timer.timeout.connect(self.check_state)
         self.save_image_state_timer = QTimer()
         self.save_image_state_timer.setInterval(2000)
         self.save_image_state_timer.timeout.connect(self.handle_save_image_state_timeout)
         self.save_image_state_flag = False
-        self.old_transform = None
 
     def load_image_state(self):
         logging.debug("Entering load_image_state function")
+        # Fast path for a fresh install: no state file means nothing to parse
+        # and no reason to delay the first window.show().
+        if not os.path.exists('state.yaml'):
+            logging.debug("No state file found. Loading with default settings.")
+            self.is_first_load = False
+            self.check_state_timer.start()
+            return
         try:
             logging.debug(f"self.is_first_load value: {self.is_first_load}")
             if not self.is_first_load:
@@ -411,7 +611,7 @@ class SaveStateHandler:
             if os.path.exists(state_file):
                 try:
                     with open(state_file, 'r') as f:
-                        state = yaml.safe_load(f)
+                        state = yaml.load(f, Loader=YamlLoader)
                         logging.debug(f"Loaded state from file: {state}")
 
                     if state is not None:
@@ -461,23 +661,24 @@ class SaveStateHandler:
                     'startup_checkbox_state': self.main.startup_checkbox.isChecked()
                 }
                 with open('state.yaml', 'w') as file:
-                    yaml.dump(state, file)
+                    yaml.dump(state, file, Dumper=YamlDumper)
                 logging.debug(f"Saved state to disk: {state}")
         except Exception as e:
             logging.error(f"An error occurred while saving the image state: {e}")
 
     def check_state(self):
         try:
-            newPos = self.main.pixmap_item.pos()
-            newTransform = self.main.view.transform()
-            if newPos is not None and newTransform is not None:
-                if newPos != self.old_pos or newTransform != self.old_transform:
-                    if not self.is_first_load:
-                        self.restart_save_image_state_timer()
-                    self.old_pos = newPos
-                    self.old_transform = newTransform
-            else:
-                logging.warning("Either pixmap position or view transform is None.")
+            pos = self.main.pixmap_item.pos()
+            transform = self.main.view.transform()
+            # Snapshot as a plain tuple of floats; comparing tuples avoids the
+            # Qt operator dispatch and keeps no QTransform/QPointF alive.
+            new_state = (pos.x(), pos.y(),
+                         transform.m11(), transform.m12(), transform.m21(),
+                         transform.m22(), transform.dx(), transform.dy())
+            if new_state != self.old_state:
+                if not self.is_first_load:
+                    self.restart_save_image_state_timer()
+                self.old_state = new_state
         except Exception as e:
             logging.error(f"Error in check_state: {e}")
 
@@ -1,19 +1,65 @@
 import atexit
-import math
+import threading
 import time
 import logging
-from PyQt6.QtCore import QThread, pyqtSignal, QTimer, QObject
-from PyQt6.QtGui import QColor
+import cv2
+import numpy as np
+from PyQt6.QtCore import QMutexLocker, QTimer
 from PyQt6.QtWidgets import QMessageBox
 from openrgb import OpenRGBClient
 from openrgb.utils import RGBColor
 
-
-class LEDController(QThread):
-    captureSignal = pyqtSignal()
-
+try:
+    from numba import njit
+    numba_enabled = True
+except ImportError:
+    numba_enabled = False
+
+if numba_enabled:
+    @njit(cache=True, fastmath=True)
+    def _update_leds(pixels, last_rgb, saturation_factor, smoothing_factor):
+        """Saturation boost plus EMA blend for all LEDs in one pass, writing
+        the smoothed colors into last_rgb in-place."""
+        for i in range(pixels.shape[0]):
+            r = pixels[i, 0] / 255.0
+            g = pixels[i, 1] / 255.0
+            b = pixels[i, 2] / 255.0
+            mx = max(r, g, b)
+            mn = min(r, g, b)
+            d = mx - mn
+            if d == 0.0:
+                h = 0.0
+            elif mx == r:
+                h = ((g - b) / d) % 6.0
+            elif mx == g:
+                h = (b - r) / d + 2.0
+            else:
+                h = (r - g) / d + 4.0
+            h *= 60.0
+            s = 0.0 if mx == 0.0 else d / mx
+            s = min(1.0, s * saturation_factor)
+            c = mx * s
+            x = c * (1.0 - abs((h / 60.0) % 2.0 - 1.0))
+            m = mx - c
+            if h < 60.0:
+                r2, g2, b2 = c, x, 0.0
+            elif h < 120.0:
+                r2, g2, b2 = x, c, 0.0
+            elif h < 180.0:
+                r2, g2, b2 = 0.0, c, x
+            elif h < 240.0:
+                r2, g2, b2 = 0.0, x, c
+            elif h < 300.0:
+                r2, g2, b2 = x, 0.0, c
+            else:
+                r2, g2, b2 = c, 0.0, x
+            last_rgb[i, 0] += smoothing_factor * ((r2 + m) * 255.0 - last_rgb[i, 0])
+            last_rgb[i, 1] += smoothing_factor * ((g2 + m) * 255.0 - last_rgb[i, 1])
+            last_rgb[i, 2] += smoothing_factor * ((b2 + m) * 255.0 - last_rgb[i, 2])
+
+
+class LEDController:
     def __init__(self, main_window):
-        super().__init__()
         self.main = main_window
         self.enabled = True
         self.client = self.connect_to_openrgb()
@@ -24,11 +70,22 @@ class LEDController(QThread):
             self.enabled = False
             return
         self.last_rgb_colors = [RGBColor(0, 0, 0)] * 24
+        # Sample positions on the LED ring, precomputed once for the fixed
+        # 480x480 capture.
+        angles = 2 * np.pi * (23 - np.arange(24)) / 24
+        radius = 479 // 2
+        self.led_x = (479 - (479 // 2 + radius * np.cos(angles))).astype(np.intp)
+        self.led_y = (479 // 2 + radius * np.sin(angles)).astype(np.intp)
+        self.last_rgb_colors_arr = np.zeros((24, 3), np.float32)
+        if numba_enabled:
+            # Warm the JIT cache so the first real tick doesn't pay the
+            # compile cost inside the 100 ms LED loop.
+            _update_leds(np.zeros((24, 3), np.uint8), np.zeros((24, 3), np.float32), 1.0, 1.0)
         self.worker = LEDWorker(self.client, self.last_rgb_colors, self)
-
-        self.started.connect(self.worker.set_colors)
-
-        QTimer.singleShot(0, self.start_timer)
+        # MainWindow constructs this controller before its capture attributes
+        # exist; defer the worker start until the event loop is up and
+        # MainWindow.__init__ has finished.
+        QTimer.singleShot(0, self.worker.start)
 
         atexit.register(self.stop_led)
 
@@ -42,72 +99,82 @@ class LEDController(QThread):
                 time.sleep(5)
         return None
 
-    def start_timer(self):
-        self.update_led_timer = QTimer()
-        self.update_led_timer.timeout.connect(self.analyze_and_set_colors)
-        self.update_led_timer.start(100)
-
-    def analyze_and_set_colors(self, width=479, height=479, smoothing_factor=0.25, saturation_factor=1.25):
+    def analyze_colors(self, smoothing_factor=0.25, saturation_factor=1.25):
         if not self.enabled:
             return
 
         try:
-            image = self.main.capture_container()
-            radius = min(width, height) // 2
-
-            for i in range(24):
-                angle = 2 * math.pi * (23 - i) / 24
-                x = width - int(width / 2 + radius * math.cos(angle))
-                y = int(height / 2 + radius * math.sin(angle))
-
-                color = QColor(image.pixel(x, y))
-                color = color.toHsv()
-
-
-                color.setHsv(color.hue(), min(255, int(color.saturation() * saturation_factor)), color.value())
-
-                rgb_color = RGBColor(color.red(), color.green(), color.blue())
-
-
-                self.last_rgb_colors[i] = RGBColor(
-                    int(self.last_rgb_colors[i].red * (
-                            1 - smoothing_factor) + rgb_color.red * smoothing_factor),
-                    int(self.last_rgb_colors[i].green * (
-                            1 - smoothing_factor) + rgb_color.green * smoothing_factor),
-                    int(self.last_rgb_colors[i].blue * (
-                            1 - smoothing_factor) + rgb_color.blue * smoothing_factor)
-                )
-
-            self.started.emit()
+            # Never render from this thread; just sample the newest frame the
+            # GUI has already pushed.
+            if self.main.capture_seq == 0:
+                return
+            arr = self.main.capture_view
+
+            # Fancy-index all 24 ring pixels at once instead of 24
+            # QImage.pixel/QColor round-trips per tick; the fancy index copies,
+            # so the lock is only held for the sample itself.
+            with QMutexLocker(self.main.capture_mutex):
+                pixels = arr[self.led_y, self.led_x, :3]
+            if numba_enabled:
+                _update_leds(pixels, self.last_rgb_colors_arr, saturation_factor, smoothing_factor)
+            else:
+                hsv = cv2.cvtColor(pixels.reshape((1, 24, 3)), cv2.COLOR_RGB2HSV)
+                hsv[..., 1] = np.minimum(hsv[..., 1] * saturation_factor, 255).astype(np.uint8)
+                rgb = cv2.cvtColor(hsv, cv2.COLOR_HSV2RGB).reshape((24, 3)).astype(np.float32)
+                self.last_rgb_colors_arr += smoothing_factor * (rgb - self.last_rgb_colors_arr)
+
+            for i, (r, g, b) in enumerate(self.last_rgb_colors_arr.astype(np.uint8)):
+                self.last_rgb_colors[i] = RGBColor(int(r), int(g), int(b))
         except Exception as e:
             logging.error(f"Error updating LED: {e}")
 
     def stop_led(self):
         self.enabled = False
-        self.update_led_timer.stop()
+        self.worker.stop_event.set()
+        if self.worker.is_alive():
+            self.worker.join(timeout=1)
         self.worker.turn_off_leds()
 
 
-class LEDWorker(QObject):
-    colorReady = pyqtSignal(object)
+class LEDWorker(threading.Thread):
+    """Plain daemon thread pacing the LED updates; the OpenRGB SDK is just
+    socket I/O, so no Qt signal/slot dispatch is needed per tick."""
 
     def __init__(self, client, last_rgb_colors, controller):
-        super().__init__()
+        super().__init__(daemon=True)
         self.client = client
         self.last_rgb_colors = last_rgb_colors
         self.controller = controller
+        self.stop_event = threading.Event()
+        self.pump_zone = self.find_pump_zone()
+
+    def run(self):
+        while not self.stop_event.wait(0.1):
+            self.controller.analyze_colors()
+            self.set_colors()
+
+    def find_pump_zone(self):
+        try:
+            for device in self.client.ee_devices:
+                if device.name == "Corsair Commander Core":
+                    return next(zone for zone in device.zones if zone.name == "Pump")
+        except Exception as e:
+            logging.error(f"Error finding pump zone: {e}")
+        return None
 
     def set_colors(self):
         if not self.controller.enabled:
             return
+        if self.pump_zone is None:
+            self.pump_zone = self.find_pump_zone()
+            if self.pump_zone is None:
+                return
         try:
-            for device in self.client.ee_devices:
-                if device.name == "Corsair Commander Core":
-                    pump_zone = next(zone for zone in device.zones if zone.name == "Pump")
-                    for i, rgb_color in enumerate(self.last_rgb_colors):
-                        pump_zone.leds[i].set_color(rgb_color, fast=True)
+            # One zone-level SDK packet instead of 24 per-LED round-trips.
+            self.pump_zone.set_colors(self.last_rgb_colors, fast=True)
         except Exception as e:
             logging.error(f"Error setting colors: {e}")
+            self.pump_zone = None
 
     def turn_off_leds(self):
         time.sleep(0.1)